@@ -19,47 +19,119 @@ Notes:
 import os
 import argparse
 import getpass
-import html
 import poplib
+import queue
 import re
 import ssl
+import threading
 import json
-from typing import List, Dict, Any, Tuple
-from email import message_from_bytes
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Iterator, Deque
+from html.parser import HTMLParser
+from email import policy
+from email.parser import BytesFeedParser
 from email.message import Message
-from email.header import decode_header, make_header
+from email.charset import Charset
+from email.header import decode_header
+from email.headerregistry import BaseHeader
 from email.utils import parseaddr, getaddresses
 from pop3_config import *
 
+try:
+    import orjson  # optional: much faster JSON output
+except ImportError:
+    orjson = None
+
+# Whitespace normalization patterns, compiled once at import time
+_RE_WS = re.compile(r"[ \t\r\f]+")
+_RE_NL = re.compile(r"\n\s*\n\s*")
+
+# TLS setup is shared by every connection: one context (CA bundle loaded
+# once) and the most recent session per (host, port) for resumption
+_SSL_CTX = ssl.create_default_context()
+_TLS_SESSIONS: Dict[Tuple[str, int], ssl.SSLSession] = {}
+
 # ------------------ Helpers ------------------
 
 
+def _is_word_sep(c: str) -> bool:
+    return c.isspace() or c in "()\\"
+
+
 def decode_header_str(value: str) -> str:
     """Decode RFC 2047/encoded-words header into a readable unicode string."""
     if not value:
         return ""
     try:
-        return str(make_header(decode_header(value)))
+        # Decode each (chunk, charset) pair directly instead of building a
+        # Header, following the same rules str(make_header(...)) applies
+        parts: List[str] = []
+        last_cs = ""
+        last_space = False
+        for chunk, enc in decode_header(value):
+            if isinstance(chunk, bytes):
+                # Strict, so undecodable input returns the raw value below
+                chunk = chunk.decode(enc or "us-ascii")
+            cs = str(Charset(enc)) if enc else "us-ascii"
+            if parts:
+                if cs == last_cs:
+                    # Runs in the same charset are joined with a space
+                    parts.append(" ")
+                elif last_cs != "us-ascii" and cs == "us-ascii":
+                    # Encoded word -> plain text, unless it starts with one
+                    if not (chunk and _is_word_sep(chunk[0])):
+                        parts.append(" ")
+                elif last_cs == "us-ascii" and not last_space:
+                    # Plain text -> encoded word, unless it ends with one
+                    parts.append(" ")
+            last_cs = cs
+            last_space = bool(chunk) and _is_word_sep(chunk[-1])
+            parts.append(chunk)
+        return "".join(parts)
     except Exception:
         return value  # best effort
 
 
+class _TextExtractor(HTMLParser):
+    """Single-pass HTML -> text collector (entities decoded by the parser)."""
+
+    _SKIP_TAGS = {"script", "style"}
+    _BLOCK_TAGS = {"p", "div", "h1", "h2", "h3", "h4", "h5", "h6", "li", "tr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.buf: List[str] = []
+        self.skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP_TAGS:
+            self.skip += 1
+        elif tag == "br":
+            self.buf.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP_TAGS:
+            if self.skip:
+                self.skip -= 1
+        elif tag in self._BLOCK_TAGS:
+            self.buf.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.buf.append(data)
+
+
 def html_to_text(html_content: str) -> str:
     """Very lightweight HTML -> text conversion without external deps."""
-    # Remove script/style contents
-    html_content = re.sub(
-        r"(?is)<(script|style).*?>.*?</\1>", "", html_content)
-    # Replace common block elements with newlines
-    html_content = re.sub(r"(?i)<\s*br\s*/?\s*>", "\n", html_content)
-    html_content = re.sub(
-        r"(?i)</\s*(p|div|h[1-6]|li|tr)\s*>", "\n", html_content)
-    # Strip all remaining tags
-    text = re.sub(r"(?s)<.*?>", "", html_content)
-    # Unescape entities and normalize whitespace
-    text = html.unescape(text)
-    text = re.sub(r"[ \t\r\f]+", " ", text).strip()
+    # Strip tags, drop script/style contents, newline on br/block ends
+    p = _TextExtractor()
+    p.feed(html_content)
+    p.close()
+    # Normalize whitespace
+    text = _RE_WS.sub(" ", "".join(p.buf)).strip()
     # Collapse repeated newlines
-    text = re.sub(r"\n\s*\n\s*", "\n", text)
+    text = _RE_NL.sub("\n", text)
     return text
 
 
@@ -78,42 +150,33 @@ def extract_text_body(msg: Message) -> str:
     if msg.is_multipart():
         plain_parts: List[str] = []
         html_parts: List[str] = []
+        other_parts: List[str] = []
+        # One walk over the MIME tree, bucketing inline text/* parts by type
         for part in msg.walk():
-            ctype = (part.get_content_type() or "").lower()
+            if part.get_content_maintype() != "text":
+                continue
             disp = (part.get("Content-Disposition") or "").lower()
             if "attachment" in disp:
                 continue
+            ctype = (part.get_content_type() or "").lower()
+            payload = part.get_payload(decode=True) or b""
+            charset = part.get_content_charset() or "utf-8"
+            try:
+                text = payload.decode(charset, errors="replace")
+            except Exception:
+                text = decode_best_effort(payload)
             if ctype == "text/plain":
-                payload = part.get_payload(decode=True) or b""
-                charset = part.get_content_charset() or "utf-8"
-                try:
-                    plain_parts.append(payload.decode(
-                        charset, errors="replace"))
-                except Exception:
-                    plain_parts.append(decode_best_effort(payload))
+                plain_parts.append(text)
             elif ctype == "text/html":
-                payload = part.get_payload(decode=True) or b""
-                charset = part.get_content_charset() or "utf-8"
-                try:
-                    html_parts.append(payload.decode(
-                        charset, errors="replace"))
-                except Exception:
-                    html_parts.append(decode_best_effort(payload))
+                html_parts.append(text)
+            else:
+                other_parts.append(text)
         if plain_parts:
             return "\n\n".join(p.strip() for p in plain_parts if p.strip())
         if html_parts:
             return "\n\n".join(html_to_text(h) for h in html_parts if h.strip())
         # fallback: any text/*
-        texts: List[str] = []
-        for part in msg.walk():
-            if part.get_content_maintype() == "text":
-                payload = part.get_payload(decode=True) or b""
-                charset = part.get_content_charset() or "utf-8"
-                try:
-                    texts.append(payload.decode(charset, errors="replace"))
-                except Exception:
-                    texts.append(decode_best_effort(payload))
-        return "\n\n".join(t.strip() for t in texts if t.strip())
+        return "\n\n".join(t.strip() for t in other_parts if t.strip())
     else:
         payload = msg.get_payload(decode=True) or b""
         ctype = (msg.get_content_type() or "").lower()
@@ -127,44 +190,231 @@ def extract_text_body(msg: Message) -> str:
         return text
 
 
+def clean_8bit(s: str) -> str:
+    """
+    Raw 8-bit header bytes reach us as surrogate escapes, which no JSON
+    encoder will write; read them as UTF-8 (undecodable bytes -> U+FFFD).
+    """
+    return s.encode("utf-8", "surrogateescape").decode("utf-8", "replace")
+
+
+def get_header(msg: Message, name: str) -> str:
+    """
+    Fetch a header. Under email.policy.default this is a structured, already
+    decoded value. Only when the modern parser raises (it can, on junk like
+    `To: "`) or yields no usable address does the raw string come back, for
+    the parseaddr/decode_header_str fallbacks to handle as compat32 did.
+    """
+    try:
+        value = msg.get(name)
+    except Exception:
+        value = None
+    else:
+        if value is None:
+            return ""
+        addresses = getattr(value, "addresses", None)
+        if addresses is None or (
+                addresses and all(a.addr_spec != "<>" for a in addresses)):
+            return value
+    for key, raw in msg.raw_items():
+        if key.lower() == name.lower():
+            return clean_8bit(raw)
+    return ""
+
+
+def header_text(value: str) -> str:
+    """Readable text of a get_header() value."""
+    if isinstance(value, BaseHeader):
+        return clean_8bit(str(value))  # already decoded
+    return decode_header_str(value)
+
+
 def parse_from_header(val: str) -> Tuple[str, str]:
     """
     Parse "From" into display name and email address.
-    Handles encoded names.
+    Handles encoded names; structured headers (email.policy.default) are
+    read directly without re-parsing.
     """
     if not val:
         return ("", "")
+    addresses = getattr(val, "addresses", None)
+    if addresses:
+        return (clean_8bit(addresses[0].display_name),
+                clean_8bit(addresses[0].addr_spec))
     name, addr = parseaddr(val)
     return (decode_header_str(name), addr or "")
 
 
 def parse_addr_list(val: str) -> List[Tuple[str, str]]:
     """Parse address list headers (To/Cc) into [(name, email), ...]."""
-    pairs = []
-    for name, addr in getaddresses([val or ""]):
-        pairs.append((decode_header_str(name), addr))
-    return pairs
+    if not val:
+        return []
+    addresses = getattr(val, "addresses", None)
+    if addresses:
+        return [(clean_8bit(a.display_name), clean_8bit(a.addr_spec))
+                for a in addresses]
+    # Split on the raw header so encoded names containing commas stay intact;
+    # only names that actually carry encoded-words go through the decoder.
+    return [(decode_header_str(name) if "=?" in name else name, addr)
+            for name, addr in getaddresses([val])]
 
 
 # ------------------ POP3 fetch ------------------
 
+def retr_window(conn: poplib.POP3) -> int:
+    """
+    How many RETRs to keep in flight: RFC 2449 only allows pipelining when
+    the server advertises the PIPELINING capability, otherwise one at a time.
+    """
+    try:
+        caps = conn.capa()
+    except poplib.error_proto:
+        return 1
+    return 16 if "PIPELINING" in caps else 1
+
+
+def pipelined_retr(conn: poplib.POP3, indices: List[int],
+                   window: int = 16) -> Iterator[List[bytes]]:
+    """
+    Send RETR commands up to `window` ahead of the responses being read, so
+    the fetch is not paying one round-trip per message. Yields each message's
+    lines in the same order as `indices`.
+    """
+    pending = iter(indices)
+    inflight: Deque[int] = deque()
+    more = True
+    while more or inflight:
+        while more and len(inflight) < window:
+            i = next(pending, None)
+            if i is None:
+                more = False
+                break
+            conn._putcmd(f"RETR {i}")
+            inflight.append(i)
+        if inflight:
+            inflight.popleft()
+            _resp, lines, _octets = conn._getlongresp()
+            yield lines
+
+
+class ResumingPOP3_SSL(poplib.POP3_SSL):
+    """
+    POP3_SSL that offers the last TLS session seen for this host:port, so
+    repeat/parallel connections can skip the full handshake.
+    """
+
+    def _create_socket(self, timeout):
+        sock = poplib.POP3._create_socket(self, timeout)
+        session = _TLS_SESSIONS.get((self.host, self.port))
+        return self.context.wrap_socket(sock, server_hostname=self.host,
+                                        session=session)
+
+
+def connect(server: str, user: str, password: str,
+            port: int = 995, use_ssl: bool = True) -> poplib.POP3:
+    """Open a POP3(S) session and log in."""
+    if use_ssl:
+        conn = ResumingPOP3_SSL(server, port, context=_SSL_CTX, timeout=60)
+    else:
+        conn = poplib.POP3(server, port, timeout=60)
+    conn.user(user)
+    conn.pass_(password)
+    if use_ssl:
+        # TLS 1.3 tickets arrive after the handshake, so grab it post-login
+        _TLS_SESSIONS[(server, port)] = conn.sock.session
+    return conn
+
+
+def quit_quietly(conn: poplib.POP3 | None) -> None:
+    try:
+        if conn is not None:
+            conn.quit()
+    except Exception:
+        # quit() skips close() when QUIT fails (e.g. RETRs still in flight)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def lines_to_message(lines: List[bytes]) -> Message:
+    """Parse RETR response lines into a Message (modern email.policy.default)."""
+    # Feed lines straight to the parser rather than joining a copy; the
+    # separator goes between lines only, exactly like b"\r\n".join(lines)
+    parser = BytesFeedParser(policy=policy.default)
+    sep = b""
+    for ln in lines:
+        parser.feed(sep)
+        parser.feed(ln)
+        sep = b"\r\n"
+    return parser.close()
+
+
+def _fetch_range(server: str, user: str, password: str, port: int,
+                 use_ssl: bool, indices: List[int], out: queue.Queue,
+                 stop: threading.Event) -> None:
+    """
+    Retrieve `indices` over a dedicated session, putting (index, lines) on
+    `out` as each message arrives. Gives up early once `stop` is set.
+    """
+    conn = None
+    try:
+        conn = connect(server, user, password, port, use_ssl)
+        window = retr_window(conn)
+        for i, lines in zip(indices, pipelined_retr(conn, indices, window)):
+            if stop.is_set():
+                break
+            out.put((i, lines))
+    finally:
+        quit_quietly(conn)
+
+
+def fetch_parallel(server: str, user: str, password: str, port: int,
+                   use_ssl: bool, indices: List[int],
+                   connections: int) -> Iterator[Tuple[int, Message]]:
+    """
+    Split `indices` round-robin across `connections` concurrent sessions and
+    fetch them in threads. Each message is parsed on the calling thread and
+    yielded as (index, Message) as soon as it arrives, so nothing is held
+    back; order is kept within a session but sessions interleave.
+    """
+    k = max(1, min(connections, len(indices)))
+    chunks = [indices[n::k] for n in range(k)]
+    out: queue.Queue = queue.Queue()
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=k) as pool:
+        try:
+            for chunk in chunks:
+                fut = pool.submit(_fetch_range, server, user, password, port,
+                                  use_ssl, chunk, out, stop)
+                # A finished worker posts its own future as an end marker
+                fut.add_done_callback(out.put)
+            pending = k
+            while pending:
+                item = out.get()
+                if isinstance(item, Future):
+                    item.result()  # re-raise a worker's error right away
+                    pending -= 1
+                    continue
+                i, lines = item
+                yield i, lines_to_message(lines)
+        finally:
+            stop.set()
+
+
 def fetch_messages(server: str, user: str, password: str,
                    port: int = 995, use_ssl: bool = True,
-                   max_messages: int | None = None) -> List[Message]:
+                   max_messages: int | None = None,
+                   connections: int = 1) -> List[Message]:
     """
     Connect to POP3(S), list messages, retrieve up to max_messages (newest first),
     return parsed email.message.Message objects.
+    With connections > 1 the retrieval is spread over that many parallel
+    sessions (the server must allow concurrent logins).
     """
     conn = None
     try:
-        if use_ssl:
-            context = ssl.create_default_context()
-            conn = poplib.POP3_SSL(server, port, context=context, timeout=60)
-        else:
-            conn = poplib.POP3(server, port, timeout=60)
-
-        conn.user(user)
-        conn.pass_(password)
+        conn = connect(server, user, password, port, use_ssl)
 
         _resp, listings, _octets = conn.list()
         indices = [int(line.split()[0]) for line in listings]
@@ -172,20 +422,18 @@ def fetch_messages(server: str, user: str, password: str,
         if max_messages is not None:
             indices = indices[:max_messages]
 
-        messages: List[Message] = []
-        for i in indices:
-            _resp, lines, _octets = conn.retr(i)
-            raw = b"\r\n".join(lines)
-            msg = message_from_bytes(raw)
-            messages.append(msg)
-        return messages
+        if connections <= 1 or not indices:
+            window = retr_window(conn)
+            return [lines_to_message(lines)
+                    for lines in pipelined_retr(conn, indices, window)]
 
     finally:
-        try:
-            if conn is not None:
-                conn.quit()
-        except Exception:
-            pass
+        # Log out before fanning out; servers may lock the maildrop per session
+        quit_quietly(conn)
+
+    fetched = dict(fetch_parallel(server, user, password, port, use_ssl,
+                                  indices, connections))
+    return [fetched[i] for i in indices]
 
 
 def message_to_struct(msg: Message) -> Dict[str, Any]:
@@ -193,12 +441,12 @@ def message_to_struct(msg: Message) -> Dict[str, Any]:
     Convert a Message into a clean dict: subject, body, from_name, from_email,
     plus optional metadata (date, message_id, to, cc).
     """
-    subject = decode_header_str(msg.get("Subject", ""))
-    from_name, from_email = parse_from_header(msg.get("From", ""))
+    subject = header_text(get_header(msg, "Subject"))
+    from_name, from_email = parse_from_header(get_header(msg, "From"))
     body = extract_text_body(msg)
 
-    to_list = parse_addr_list(msg.get("To", ""))
-    cc_list = parse_addr_list(msg.get("Cc", ""))
+    to_list = parse_addr_list(get_header(msg, "To"))
+    cc_list = parse_addr_list(get_header(msg, "Cc"))
 
     return {
         "subject": subject,
@@ -206,8 +454,8 @@ def message_to_struct(msg: Message) -> Dict[str, Any]:
         "from_name": from_name,
         "from_email": from_email,
         # Optional-but-useful fields:
-        "date": decode_header_str(msg.get("Date", "")),
-        "message_id": msg.get("Message-ID", ""),
+        "date": header_text(get_header(msg, "Date")),
+        "message_id": clean_8bit(str(get_header(msg, "Message-ID"))),
         "to": [{"name": n, "email": a} for n, a in to_list],
         "cc": [{"name": n, "email": a} for n, a in cc_list],
     }
@@ -236,6 +484,8 @@ def main():
     ap.add_argument("--out", help="Output JSON path (e.g., emails.json)")
     ap.add_argument("--max", type=int, default=10,
                     help="Max messages to fetch (newest first)")
+    ap.add_argument("--connections", type=int, default=1,
+                    help="Parallel POP3 sessions (server must allow concurrent logins)")
     ap.set_defaults(use_ssl=True)
     ap.set_defaults(server=server)
     ap.set_defaults(user=user)
@@ -256,6 +506,7 @@ def main():
         port=args.port,
         use_ssl=args.use_ssl,
         max_messages=args.max,
+        connections=args.connections,
     )
 
     structs = [message_to_struct(m) for m in msgs]
@@ -275,8 +526,12 @@ def main():
     # Join with desired filename
     default_out=os.path.join(script_dir, args.out)
 
-    with open(default_out, "w", encoding="utf-8") as f:
-        json.dump(structs, f, ensure_ascii=False, indent=2)
+    if orjson is not None:
+        with open(default_out, "wb") as f:
+            f.write(orjson.dumps(structs, option=orjson.OPT_INDENT_2))
+    else:
+        with open(default_out, "w", encoding="utf-8") as f:
+            json.dump(structs, f, ensure_ascii=False, indent=2)
 
 
 if __name__ == "__main__":
@@ -11,32 +11,75 @@ with header: ,label,text,label_num
 import os
 import argparse
 import getpass
-import html
 import poplib
+import queue
 import re
 import ssl
+import threading
 import string
-from typing import Optional, Tuple, List
-from email import message_from_bytes
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Tuple, List, Dict, Iterable, Iterator, Deque
+from html.parser import HTMLParser
+from email import policy
+from email.parser import BytesFeedParser
 from email.message import Message
 from pop3_config import *
 
+# Whitespace normalization patterns, compiled once at import time
+_RE_WS = re.compile(r"[ \t\r\f]+")
+_RE_NL = re.compile(r"\n\s*\n\s*")
+_RE_WS_ALL = re.compile(r"\s+")
+
+# TLS setup is shared by every connection: one context (CA bundle loaded
+# once) and the most recent session per (host, port) for resumption
+_SSL_CTX = ssl.create_default_context()
+_TLS_SESSIONS: Dict[Tuple[str, int], ssl.SSLSession] = {}
+
+# Punctuation-deleting translation tables, built once. _NORM_TBL also
+# lowercases A-Z so ASCII text needs only one translate pass.
+_PUNCT_TBL = str.maketrans('', '', string.punctuation)
+_NORM_TBL = str.maketrans(string.ascii_uppercase, string.ascii_lowercase,
+                          string.punctuation)
+
+
+class _TextExtractor(HTMLParser):
+    """Single-pass HTML -> text collector (entities decoded by the parser)."""
+
+    _SKIP_TAGS = {"script", "style"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.buf: List[str] = []
+        self.skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP_TAGS:
+            self.skip += 1
+        elif tag in ("br", "p"):
+            self.buf.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP_TAGS:
+            if self.skip:
+                self.skip -= 1
+        elif tag == "p":
+            self.buf.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.buf.append(data)
+
 
 def html_to_text(html_content: str) -> str:
     """Very lightweight HTML -> text conversion without external deps."""
-    # Remove script/style contents
-    html_content = re.sub(
-        r"(?is)<(script|style).*?>.*?</\1>", "", html_content)
-    # Replace <br> and <p> with newlines
-    html_content = re.sub(r"(?i)<\s*br\s*/?\s*>", "\n", html_content)
-    html_content = re.sub(r"(?i)<\s*/?\s*p\s*>", "\n", html_content)
-    # Strip all remaining tags
-    text = re.sub(r"(?s)<.*?>", "", html_content)
-    # Unescape entities
-    text = html.unescape(text)
+    # Strip tags, drop script/style contents, newline on <br> and <p>
+    p = _TextExtractor()
+    p.feed(html_content)
+    p.close()
     # Normalize whitespace
-    text = re.sub(r"[ \t\r\f]+", " ", text)
-    text = re.sub(r"\n\s*\n\s*", "\n", text)
+    text = _RE_WS.sub(" ", "".join(p.buf))
+    text = _RE_NL.sub("\n", text)
     return text.strip()
 
 
@@ -52,42 +95,33 @@ def extract_body(msg: Message) -> str:
     if msg.is_multipart():
         plain_parts: List[str] = []
         html_parts: List[str] = []
+        other_parts: List[str] = []
+        # One walk over the MIME tree, bucketing inline text/* parts by type
         for part in msg.walk():
-            ctype = (part.get_content_type() or "").lower()
+            if part.get_content_maintype() != "text":
+                continue
             disp = (part.get("Content-Disposition") or "").lower()
             if "attachment" in disp:
                 continue
+            ctype = (part.get_content_type() or "").lower()
+            payload = part.get_payload(decode=True) or b""
+            charset = part.get_content_charset() or "utf-8"
+            try:
+                text = payload.decode(charset, errors="replace")
+            except Exception:
+                text = decode_best_effort(payload)
             if ctype == "text/plain":
-                payload = part.get_payload(decode=True) or b""
-                charset = part.get_content_charset() or "utf-8"
-                try:
-                    plain_parts.append(payload.decode(
-                        charset, errors="replace"))
-                except Exception:
-                    plain_parts.append(decode_best_effort(payload))
+                plain_parts.append(text)
             elif ctype == "text/html":
-                payload = part.get_payload(decode=True) or b""
-                charset = part.get_content_charset() or "utf-8"
-                try:
-                    html_parts.append(payload.decode(
-                        charset, errors="replace"))
-                except Exception:
-                    html_parts.append(decode_best_effort(payload))
+                html_parts.append(text)
+            else:
+                other_parts.append(text)
         if plain_parts:
             return "\n\n".join(p.strip() for p in plain_parts if p.strip())
         if html_parts:
             return "\n\n".join(html_to_text(h) for h in html_parts if h.strip())
         # Fallback: any text/* we can decode
-        texts: List[str] = []
-        for part in msg.walk():
-            if part.get_content_maintype() == "text":
-                payload = part.get_payload(decode=True) or b""
-                charset = part.get_content_charset() or "utf-8"
-                try:
-                    texts.append(payload.decode(charset, errors="replace"))
-                except Exception:
-                    texts.append(decode_best_effort(payload))
-        return " ".join(t.strip() for t in texts if t.strip())
+        return " ".join(t.strip() for t in other_parts if t.strip())
     else:
         payload = msg.get_payload(decode=True) or b""
         ctype = (msg.get_content_type() or "").lower()
@@ -118,6 +152,147 @@ def label_to_num(label: str) -> int:
     return 1 if label.lower() == "spam" else 0
 
 
+def retr_window(conn: poplib.POP3) -> int:
+    """
+    How many RETRs to keep in flight: RFC 2449 only allows pipelining when
+    the server advertises the PIPELINING capability, otherwise one at a time.
+    """
+    try:
+        caps = conn.capa()
+    except poplib.error_proto:
+        return 1
+    return 16 if "PIPELINING" in caps else 1
+
+
+def pipelined_retr(conn: poplib.POP3, indices: List[int],
+                   window: int = 16) -> Iterator[List[bytes]]:
+    """
+    Send RETR commands up to `window` ahead of the responses being read, so
+    the fetch is not paying one round-trip per message. Yields each message's
+    lines in the same order as `indices`.
+    """
+    pending = iter(indices)
+    inflight: Deque[int] = deque()
+    more = True
+    while more or inflight:
+        while more and len(inflight) < window:
+            i = next(pending, None)
+            if i is None:
+                more = False
+                break
+            conn._putcmd(f"RETR {i}")
+            inflight.append(i)
+        if inflight:
+            inflight.popleft()
+            _resp, lines, _octets = conn._getlongresp()
+            yield lines
+
+
+class ResumingPOP3_SSL(poplib.POP3_SSL):
+    """
+    POP3_SSL that offers the last TLS session seen for this host:port, so
+    repeat/parallel connections can skip the full handshake.
+    """
+
+    def _create_socket(self, timeout):
+        sock = poplib.POP3._create_socket(self, timeout)
+        session = _TLS_SESSIONS.get((self.host, self.port))
+        return self.context.wrap_socket(sock, server_hostname=self.host,
+                                        session=session)
+
+
+def connect(server: str, user: str, password: str,
+            port: int = 995, use_ssl: bool = True) -> poplib.POP3:
+    """Open a POP3(S) session and log in."""
+    if use_ssl:
+        conn = ResumingPOP3_SSL(server, port, context=_SSL_CTX, timeout=60)
+    else:
+        conn = poplib.POP3(server, port, timeout=60)
+    conn.user(user)
+    conn.pass_(password)
+    if use_ssl:
+        # TLS 1.3 tickets arrive after the handshake, so grab it post-login
+        _TLS_SESSIONS[(server, port)] = conn.sock.session
+    return conn
+
+
+def quit_quietly(conn: Optional[poplib.POP3]) -> None:
+    try:
+        if conn is not None:
+            conn.quit()
+    except Exception:
+        # quit() skips close() when QUIT fails (e.g. RETRs still in flight)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def lines_to_message(lines: List[bytes]) -> Message:
+    """Parse RETR response lines into a Message (modern email.policy.default)."""
+    # Feed lines straight to the parser rather than joining a copy; the
+    # separator goes between lines only, exactly like b"\r\n".join(lines)
+    parser = BytesFeedParser(policy=policy.default)
+    sep = b""
+    for ln in lines:
+        parser.feed(sep)
+        parser.feed(ln)
+        sep = b"\r\n"
+    return parser.close()
+
+
+def _fetch_range(server: str, user: str, password: str, port: int,
+                 use_ssl: bool, indices: List[int], out: queue.Queue,
+                 stop: threading.Event) -> None:
+    """
+    Retrieve `indices` over a dedicated session, putting (index, lines) on
+    `out` as each message arrives. Gives up early once `stop` is set.
+    """
+    conn = None
+    try:
+        conn = connect(server, user, password, port, use_ssl)
+        window = retr_window(conn)
+        for i, lines in zip(indices, pipelined_retr(conn, indices, window)):
+            if stop.is_set():
+                break
+            out.put((i, lines))
+    finally:
+        quit_quietly(conn)
+
+
+def fetch_parallel(server: str, user: str, password: str, port: int,
+                   use_ssl: bool, indices: List[int],
+                   connections: int) -> Iterator[Tuple[int, Message]]:
+    """
+    Split `indices` round-robin across `connections` concurrent sessions and
+    fetch them in threads. Each message is parsed on the calling thread and
+    yielded as (index, Message) as soon as it arrives, so nothing is held
+    back; order is kept within a session but sessions interleave.
+    """
+    k = max(1, min(connections, len(indices)))
+    chunks = [indices[n::k] for n in range(k)]
+    out: queue.Queue = queue.Queue()
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=k) as pool:
+        try:
+            for chunk in chunks:
+                fut = pool.submit(_fetch_range, server, user, password, port,
+                                  use_ssl, chunk, out, stop)
+                # A finished worker posts its own future as an end marker
+                fut.add_done_callback(out.put)
+            pending = k
+            while pending:
+                item = out.get()
+                if isinstance(item, Future):
+                    item.result()  # re-raise a worker's error right away
+                    pending -= 1
+                    continue
+                i, lines = item
+                yield i, lines_to_message(lines)
+        finally:
+            stop.set()
+
+
 def fetch_messages(
     server: str,
     user: str,
@@ -125,43 +300,74 @@ def fetch_messages(
     port: int = 995,
     use_ssl: bool = True,
     max_messages: Optional[int] = None,
-) -> List[Message]:
-    """Fetch up to max_messages and return parsed Message objects (newest first)."""
+    connections: int = 1,
+) -> Iterator[Message]:
+    """
+    Fetch up to max_messages and yield parsed Message objects (newest first).
+    With connections > 1 the retrieval is spread over that many parallel
+    sessions (the server must allow concurrent logins); messages are then
+    yielded as they arrive, newest first within each session.
+    """
     conn = None
     try:
-        if use_ssl:
-            context = ssl.create_default_context()
-            conn = poplib.POP3_SSL(server, port, context=context, timeout=60)
-        else:
-            conn = poplib.POP3(server, port, timeout=60)
-        conn.user(user)
-        conn.pass_(password)
+        conn = connect(server, user, password, port, use_ssl)
         # Message list
         _resp, listings, _octets = conn.list()
         indices = [int(line.split()[0]) for line in listings]
         indices.sort(reverse=True)  # newest first
         if max_messages is not None:
             indices = indices[: max(0, int(max_messages))]
-        messages: List[Message] = []
-        for i in indices:
-            _resp, lines, _octets = conn.retr(i)
-            raw = b"\r\n".join(lines)
-            msg = message_from_bytes(raw)
-            messages.append(msg)
-        return messages
+        if connections <= 1 or not indices:
+            window = retr_window(conn)
+            for lines in pipelined_retr(conn, indices, window):
+                yield lines_to_message(lines)
+            return
     finally:
-        try:
-            if conn is not None:
-                conn.quit()
-        except Exception:
-            pass
+        # Log out before fanning out; servers may lock the maildrop per session
+        quit_quietly(conn)
+
+    for _i, msg in fetch_parallel(server, user, password, port, use_ssl,
+                                  indices, connections):
+        yield msg
 
 
-def write_email_file(rows: List[str], out_path: str) -> None:
-    with open(out_path, "w", encoding="utf-8") as f:
-        for text in rows:
-            # Each email body on its own line
-            f.write(text.strip().replace("\n", " ") + "\n")
+def normalize_text(text: str) -> str:
+    """Lowercase and drop punctuation; a single translate pass for ASCII."""
+    if text.isascii():
+        return text.translate(_NORM_TBL)
+    return text.lower().translate(_PUNCT_TBL)
+
+
+def message_to_line(msg: Message) -> str:
+    """Lowercase the body, drop punctuation and collapse it onto one line."""
+    email_body = extract_body(msg)
+    email_body = email_body.replace("\r\n", " ")
+    return _RE_WS_ALL.sub(
+        ' ', normalize_text(email_body)).strip()
+
+
+def write_email_file(rows: Iterable[str], out_path: str) -> int:
+    """
+    Stream rows to out_path as they arrive; returns the number written.
+    Rows go to a temporary file that only replaces out_path once every row
+    was written, so a failed fetch leaves any existing output untouched.
+    """
+    tmp_path = out_path + ".part"
+    count = 0
+    try:
+        with open(tmp_path, "w", encoding="utf-8", buffering=1 << 20) as f:
+            for text in rows:
+                # Each email body on its own line
+                f.write(text.strip().replace("\n", " ") + "\n")
+                count += 1
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    os.replace(tmp_path, out_path)
+    return count
 
 
 def main():
@@ -186,6 +392,8 @@ def main():
                     action="store_false", help="Disable SSL")
     ap.add_argument("--max", type=int, default=None,
                     help="Max messages to fetch (default: all)")
+    ap.add_argument("--connections", type=int, default=1,
+                    help="Parallel POP3 sessions (server must allow concurrent logins)")
     ap.add_argument("--out",
                     help="Output TXT path (e.g., emails.txt)")
     ap.add_argument("--default-label", choices=["ham", "spam"],
@@ -206,6 +414,12 @@ def main():
     else:
         password = getpass.getpass(f"Password for {args.user}@{args.server}: ")
 
+    # Directory where this script lives
+    script_dir=os.path.dirname(os.path.abspath(__file__))
+
+    # Join with desired filename
+    default_out=os.path.join(script_dir, args.out)
+
     msgs = fetch_messages(
         server=server,
         user=user,
@@ -213,25 +427,13 @@ def main():
         port=args.port,
         use_ssl=args.use_ssl,
         max_messages=args.max,
+        connections=args.connections,
     )
 
-    rows: List[str] = []
-    for msg in msgs:
-        email_body = extract_body(msg)
-        email_body = email_body.replace("\r\n", " ")
-        email_text=email_body.lower().translate(
-            str.maketrans('', '', string.punctuation)).split()
-        email_text=' '.join(email_text)
-        rows.append(email_text)
-
-    # Directory where this script lives
-    script_dir=os.path.dirname(os.path.abspath(__file__))
-
-    # Join with desired filename
-    default_out=os.path.join(script_dir, args.out)
-
-    write_email_file(rows, default_out)
-    print(f"Wrote {len(rows)} messages to {default_out}")
+    # Each message is written as soon as it is fetched; nothing accumulates
+    count = write_email_file(
+        (message_to_line(msg) for msg in msgs), default_out)
+    print(f"Wrote {count} messages to {default_out}")
 
 
 if __name__ == "__main__":
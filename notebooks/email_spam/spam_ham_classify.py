@@ -1,17 +1,22 @@
 #!/usr/bin/env python3
 """
-Classify emails from emails.txt using saved spam/ham model + vectorizer.
+Classify emails from emails.txt using the saved spam/ham model.
 """
 
 import joblib
+import mmap
 import os
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
 
-# Load saved model/vectorizer
+# Load saved model; the vectorizer is stateless and must match training
 clf = joblib.load("spam_ham_model.pkl")
-vectorizer = joblib.load("spam_ham_vectorizer.pkl")
+vectorizer = HashingVectorizer(n_features=2**18, alternate_sign=False,
+                               norm=None, dtype=np.float32)
 
 # Preprocess function must match training
 import string
+from functools import lru_cache
 import nltk
 from nltk.corpus import stopwords
 from nltk.stem.porter import PorterStemmer
@@ -24,11 +29,24 @@ def ensure_stopwords():
 
 ensure_stopwords()
 stemmer = PorterStemmer()
-stopwords_set = set(stopwords.words("english"))
+stopwords_set = frozenset(stopwords.words("english"))
+_PUNCT_TBL = str.maketrans('', '', string.punctuation)
+# Lowercases A-Z and drops punctuation in one pass (ASCII text only)
+_NORM_TBL = str.maketrans(string.ascii_uppercase, string.ascii_lowercase,
+                          string.punctuation)
+# Tokens repeat heavily across emails; memoize the (slow) Porter stemmer
+_stem = lru_cache(maxsize=50_000)(stemmer.stem)
 
-def prepare_email_text(email_text: str) -> str:
-    email_text = email_text.lower().translate(str.maketrans('', '', string.punctuation)).split()
-    email_text = [stemmer.stem(w) for w in email_text if w not in stopwords_set]
+def normalize_text(text: str) -> str:
+    """Lowercase and drop punctuation; a single translate pass for ASCII."""
+    if text.isascii():
+        return text.translate(_NORM_TBL)
+    return text.lower().translate(_PUNCT_TBL)
+
+# Defaults bind the stemmer and stopwords as fast locals (called per email)
+def prepare_email_text(email_text: str, _stem=_stem, _sw=stopwords_set) -> str:
+    email_text = normalize_text(email_text).split()
+    email_text = [_stem(w) for w in email_text if w not in _sw]
     return " ".join(email_text)
 
 # Load emails.txt
@@ -37,14 +55,25 @@ if not os.path.isfile(emails_path):
     print("No emails.txt found")
     exit()
 
-with open(emails_path, "r", encoding="utf-8") as f:
-    email_data = [line.strip() for line in f if line.strip()]
+# Map the file and decode it in one go rather than line by line
+# (mmap cannot map an empty file, so skip it in that case)
+lines = []
+if os.path.getsize(emails_path) > 0:
+    with open(emails_path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        lines = mm[:].decode("utf-8", errors="replace").splitlines()
+email_data = [s for s in map(str.strip, lines) if s]
+
+# Nothing to classify (e.g. an empty mailbox); the batch calls below
+# cannot handle zero rows
+if not email_data:
+    exit()
 
-# Predict
-for text in email_data:
-    processed = prepare_email_text(text)
-    x_email = vectorizer.transform([processed])
-    pred = clf.predict(x_email)[0]  # 0 = ham, 1 = spam
+# Predict in one batch (0 = ham, 1 = spam)
+processed = [prepare_email_text(t) for t in email_data]
+X = vectorizer.transform(processed)
+preds = clf.predict(X)
+for text, pred in zip(email_data, preds):
     preview = text[:100] + ("..." if len(text) > 100 else "")
     label = "spam" if pred == 1 else "ham"
     print(f"{label} ({pred}) → {preview}")